@@ -51,6 +51,26 @@ class GRAL:
         self.vegetation_file = vegetation_file
         self.line_file = line_file
 
+    def resolve_geofile(self, filename):
+        """
+        Resolves the path of a geodata file, accepting either a shapefile or a GeoPackage.
+
+        Args:
+            filename (str): The name of the geodata file.
+
+        Returns:
+            str: The path of the geodata file that exists on disk.
+        """
+        path = f'{self.base_directory}/{filename}'
+        if os.path.exists(path):
+            return path
+        stem = os.path.splitext(path)[0]
+        for extension in ('.gpkg', '.shp'):
+            alternative = f'{stem}{extension}'
+            if os.path.exists(alternative):
+                return alternative
+        return path
+
     #############################
     # REQUIRED FILES GENERATION #
     def create_greb_file(self, bbox, horizontal_slices) -> None:
@@ -282,7 +302,7 @@ class GRAL:
             None
         """
         print('Creating buildings file...')
-        buildings_gdf = gpd.read_file(f'{self.base_directory}/{self.buildings_file}')
+        buildings_gdf = gpd.read_file(self.resolve_geofile(self.buildings_file))
         buildings_file_path = f'{self.base_directory}/buildings.dat'
         with open(buildings_file_path, 'w') as file:
             for index, row in buildings_gdf.iterrows():
@@ -305,7 +325,7 @@ class GRAL:
             None
         """
         print('Creating vegetation file...')
-        vegetation_gdf = gpd.read_file(f'{self.base_directory}/{self.vegetation_file}')
+        vegetation_gdf = gpd.read_file(self.resolve_geofile(self.vegetation_file))
         vegetation_file_path = f'{self.base_directory}/vegetation.dat'
         with open(vegetation_file_path, 'w') as file:
             for index, row in vegetation_gdf.iterrows():
@@ -356,7 +376,7 @@ class GRAL:
             mean_pollutant_error = 1
         if not is_online:
             id = "edge_id"
-        line_gdf = gpd.read_file(f'{self.base_directory}/{self.line_file}')
+        line_gdf = gpd.read_file(self.resolve_geofile(self.line_file))
         # Remove NaN values
         line_gdf = line_gdf.dropna(subset=[f"{pollutant}_abs"])
         # Remove values less or equal to 0
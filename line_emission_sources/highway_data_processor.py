@@ -99,24 +99,26 @@ class HighwayDataProcessor:
         return highway_gdf
 
     @staticmethod
-    def generate_lanes_probability(highway_gdf: GeoDataFrame) -> np.ndarray:
+    def generate_lanes_probability(highway_gdf: GeoDataFrame):
         """
-        Generate the probability of each lane in a highway based on the number of lanes.
+        Generate the probability of each lane count in a highway based on the number of lanes.
 
         Parameters:
         highway_gdf (gpd.GeoDataFrame): A GeoDataFrame containing the highway data.
 
         Returns:
-        np.ndarray: An array containing the probability of each lane.
+        tuple: The unique lane counts and the probability of each lane count.
         """
         print("Generating lanes probability...")
-        # Copy the dataframe
-        highway_df_copy = highway_gdf.copy()
-        # Drop the rows with 0 values on the lane column
-        highway_df_copy = highway_df_copy[highway_df_copy['lanes'] > 0]
-        total_ways = np.sum(highway_df_copy['lanes'])
-        n_lanes_prob = np.true_divide(highway_df_copy['lanes'], total_ways)
-        return n_lanes_prob
+        # Keep only the rows with a valid lane count
+        valid_lanes = highway_gdf.loc[highway_gdf['lanes'] > 0, 'lanes'].to_numpy()
+        # Histogram over the unique lane counts instead of the raw column, so
+        # sampling works on a handful of values rather than every row
+        values, counts = np.unique(valid_lanes, return_counts=True)
+        # Same distribution as sampling rows weighted by their lane count
+        weights = counts * values
+        probs = weights / weights.sum()
+        return values, probs
 
     def insert_lanes_to_highway(self, is_online, highway_gdf: pd.DataFrame, sumo_net) -> pd.DataFrame:
         """
@@ -156,18 +158,16 @@ class HighwayDataProcessor:
                         highway_gdf.loc[index, 'lanes'] = n_lanes
 
             # This is to make sure that all ways have lanes
-            # Generate the probability of each lane
-            n_lanes_prob = self.generate_lanes_probability(highway_gdf)
-            # Copy the dataframe
-            highway_gdf_copy = highway_gdf.copy()
-            # Drop the rows with nan values on the lane column
-            highway_gdf_copy = highway_gdf_copy[highway_gdf_copy['lanes'] > 0]
-            # Iter rows of pandas dataframe and replace the 0 values with a random value based on the probability
+            # Generate the probability of each lane count
+            values, probs = self.generate_lanes_probability(highway_gdf)
+            # Replace the 0 values with random values drawn in one bulk call
             print("Assigning number of lanes based on the probability distribution...")
-            for index, row in tqdm(highway_gdf.iterrows()):
-                if row['lanes'] <= 0:
-                    highway_gdf.loc[index, 'lanes'] = np.random.choice(
-                        highway_gdf_copy['lanes'], 1, p=n_lanes_prob)
+            mask = highway_gdf['lanes'] <= 0
+            n_zeros = int(mask.sum())
+            if n_zeros > 0:
+                rng = np.random.default_rng()
+                highway_gdf.loc[mask, 'lanes'] = rng.choice(
+                    values, size=n_zeros, p=probs, shuffle=False)
 
         return highway_gdf
 
@@ -291,29 +291,20 @@ class HighwayDataProcessor:
         that contains the osm id of each edge.
         """
         print("Converting the edges of the sumo emission edges file to osm id...")
-        # Explicitly create the 'osmid' column with type 'object' (string)
-        edges_emissions_df['osmid'] = np.nan
-        edges_emissions_df['osmid'] = edges_emissions_df['osmid'].astype(
-            object)
-
-        # Create a dictionary with the osm id and the edge id as the value. Lambda function to get the osm id from the edge id
-        osm_id_edge_id_dict = {osm_id: sumo_net.getEdgesByOrigID(
-            osm_id) for osm_id in osm_id_list}
-
         # Cast all edge ID values that are not strings to strings
         edges_emissions_df['edge_id'] = edges_emissions_df['edge_id'].astype(
             str)
-        # Iterate over the dictionary and get the osm id
-        for osm_id, edges_set in tqdm(osm_id_edge_id_dict.items()):
-            if len(edges_set) > 0:
-                for edge in edges_set:
-                    edge_id = edge.getID()
-                    # Cast all edge ID values that are not strings to strings
-                    if type(edge.getID()) != str:
-                        edge_id = str(edge.getID())
-                    # Insert the osm id in the dataframe based on the edge id
-                    edges_emissions_df.loc[(
-                        (edges_emissions_df['edge_id'] == edge_id)), 'osmid'] = osm_id
+
+        # Build one edge id -> osm id lookup so the whole column is mapped in
+        # a single hashed pass instead of one full-column scan per edge
+        edge_id_to_osm_id = {}
+        for osm_id in tqdm(osm_id_list):
+            for edge in sumo_net.getEdgesByOrigID(osm_id):
+                edge_id_to_osm_id[str(edge.getID())] = osm_id
+
+        # Edges without a matching osm id become NaN, as before
+        edges_emissions_df['osmid'] = edges_emissions_df['edge_id'].map(
+            edge_id_to_osm_id)
 
         return edges_emissions_df
 
@@ -6,40 +6,269 @@ from line_emission_sources.highway_data_processor import HighwayDataProcessor as
 from maps.maps_processor import MapGenerator as Maps
 from gral.gral_processor import GRAL
 from display_results.results_processor import ResultsProcessor
-import osmnx as ox
 import sumolib as sumo
 from local_files_processor.local_file_processor import OSMFileProcessor, NetFileProcessor, XMLFileProcessor
 import subprocess
+import sys
+import threading
+import pandas as pd
+import concurrent.futures
+import pickle
+import pyproj
 
 
-def create_shapefile(geo_df, coordinate_system, directory, filename):
+# The output layers have fixed, small schemas known ahead of time; passing
+# them to the fiona fallback writer skips its per-call schema inference scan
+SCHEMA_BUILDINGS = {
+    'geometry': 'Polygon',
+    'properties': {'osmid': 'int', 'building': 'str',
+                   'building:levels': 'int', 'height': 'int'},
+}
+SCHEMA_HIGHWAYS = {
+    'geometry': 'LineString',
+    'properties': {'edge_id': 'str', 'NOx_abs': 'float', 'PMx_abs': 'float',
+                   'CO_abs': 'float', 'lanes': 'int', 'length': 'float',
+                   'width': 'int', 'emission_src_group': 'str'},
+}
+SCHEMA_VEGETATION = {
+    'geometry': 'Polygon',
+    'properties': {'osmid': 'int', 'name': 'str'},
+}
+
+
+def create_geofile(geo_df, coordinate_system, directory, filename, driver="GPKG", schema=None):
     """
-    Creates a shapefile from a GeoDataFrame.
+    Creates a geodata file (GeoPackage by default) from a GeoDataFrame.
 
     Parameters:
-    geo_df (GeoDataFrame): The GeoDataFrame to be converted to a shapefile.
+    geo_df (GeoDataFrame): The GeoDataFrame to be written.
     coordinate_system (str): The coordinate reference system (CRS) of the GeoDataFrame, specified as an EPSG code.
-    directory (str): The directory where the shapefile will be saved.
-    filename (str): The name of the output shapefile.
+    directory (str): The directory where the file will be saved.
+    filename (str): The name of the output file.
+    driver (str): The OGR driver to use, 'GPKG' or 'ESRI Shapefile'. Defaults to 'GPKG'.
+    schema (dict, optional): A precomputed fiona schema for the layer. Defaults to None.
 
     Returns:
     None
     """
-    print("Creating shapefile...")
+    print("Creating geodata file...")
     try:
-        # Reproject the GeoDataFrame to the specified coordinate system
-        geo_df_reprojected = ox.projection.project_gdf(
-            geo_df, to_crs=coordinate_system, to_latlong=False)
-
-        # Define the coordinate reference system (CRS) i.e.: EPSG:4326
-        geo_df_reprojected.crs = coordinate_system
+        # Reproject only when the GeoDataFrame is not already in the target
+        # coordinate system; normalizing through pyproj.CRS catches the
+        # spellings ('EPSG:4326', 4326, a CRS object) that compare unequal
+        # as raw values, and to_crs reuses pyproj's cached transformer
+        if geo_df.crs is not None and geo_df.crs == pyproj.CRS.from_user_input(coordinate_system):
+            geo_df_reprojected = geo_df
+        else:
+            geo_df_reprojected = geo_df.to_crs(coordinate_system)
 
         # Optionally, save the GeoDataFrame to a file
-        os.makedirs(directory, exist_ok=True)
-        geo_df_reprojected.to_file(
-            f'{directory}/{filename}', driver='ESRI Shapefile')
+        layer = os.path.splitext(filename)[0]
+        if driver == "GPKG":
+            # One SQLite transaction instead of the multi-file shapefile write
+            path = f'{directory}/{layer}.gpkg'
+            write_kwargs = {'driver': 'GPKG', 'layer': layer}
+        else:
+            path = f'{directory}/{filename}'
+            write_kwargs = {'driver': driver}
+        try:
+            # pyogrio writes the whole frame through a vectorized C path
+            geo_df_reprojected.to_file(path, engine='pyogrio', **write_kwargs)
+        except (ImportError, ValueError):
+            # Fall back to the fiona engine when pyogrio is unavailable or
+            # rejects the frame (e.g. NaN in string columns)
+            try:
+                geo_df_reprojected.to_file(path, schema=schema, **write_kwargs)
+            except Exception:
+                # A stale schema must not break the write; let fiona infer it
+                geo_df_reprojected.to_file(path, **write_kwargs)
     except Exception as e:
-        print(f"Failed to create shapefile: {e}")
+        print(f"Failed to create geodata file: {e}")
+
+
+def convert_bbox_to_epsg(location, epsg):
+    """
+    Converts a WGS84 bounding box to the given EPSG code in one batched call.
+
+    Parameters:
+    location (dict): The bounding box with north, south, east and west keys in EPSG:4326.
+    epsg (int): The EPSG code of the target coordinate system.
+
+    Returns:
+    dict: The bounding box converted to the target coordinate system.
+    """
+    transformer = pyproj.Transformer.from_crs(4326, epsg, always_xy=True)
+    # One vectorized call converts both corners through PROJ's batched API
+    xs, ys = transformer.transform(
+        [location["west"], location["east"]],
+        [location["north"], location["south"]])
+    return {"north": ys[0], "south": ys[1], "east": xs[1], "west": xs[0]}
+
+
+def read_net_cached(net_file_path, base_directory):
+    """
+    Reads a SUMO network file, reusing a pickled parse when the file is unchanged.
+
+    Parameters:
+    net_file_path (str): The path to the SUMO network file.
+    base_directory (str): The directory where the pickled net is cached.
+
+    Returns:
+    sumolib.net.Net: The parsed SUMO network.
+    """
+    mtime = os.path.getmtime(net_file_path)
+    cache_path = os.path.join(base_directory or '.', '.net_cache.pkl')
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            cached_mtime, net = pickle.load(cache_file)
+        if cached_mtime == mtime:
+            return net
+    except (OSError, EOFError, pickle.PickleError, ValueError, AttributeError):
+        pass
+    # Parse once and cache; unpickling is much faster than re-parsing the XML
+    net = sumo.net.readNet(net_file_path)
+    # Pickling recurses through the edge/node graph, so city-scale nets can
+    # exceed the default recursion limit. Widening the limit on the main
+    # thread would let the C pickler overflow the C stack, so run the dump on
+    # a worker thread given a much larger stack and raise the limit only
+    # there; any failure (including a RecursionError on interpreters that cap
+    # C recursion separately) falls back to the uncached parse.
+    dump_errors = []
+
+    def dump_cache():
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, 100000))
+        try:
+            with open(cache_path, 'wb') as cache_file:
+                pickle.dump((mtime, net), cache_file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        except (OSError, pickle.PickleError, TypeError, RecursionError) as error:
+            dump_errors.append(error)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+
+    previous_stack_size = threading.stack_size(256 * 1024 * 1024)
+    try:
+        dump_thread = threading.Thread(target=dump_cache)
+        dump_thread.start()
+    finally:
+        threading.stack_size(previous_stack_size)
+    dump_thread.join()
+    if dump_errors:
+        try:
+            # Do not leave a truncated cache behind
+            os.unlink(cache_path)
+        except OSError:
+            pass
+    return net
+
+
+def run_buildings_stage(location, is_online, osm_file, target_crs, base_directory, buildings_shp_file):
+    """
+    Processes the buildings data and writes it to a geodata file.
+
+    Parameters:
+    location (dict): The bounding box of the area of interest.
+    is_online (bool): Whether to process online or offline.
+    osm_file (str): The path to the OSM file.
+    target_crs (str): The target CRS of the geodata file.
+    base_directory (str): The base directory for the project.
+    buildings_shp_file (str): The name of the buildings geodata file.
+
+    Returns:
+    None
+    """
+    buildings_gdf = Buildings(location).process_buildings(
+        is_online, osm_file=osm_file)
+    create_geofile(buildings_gdf, target_crs, base_directory,
+                   buildings_shp_file, schema=SCHEMA_BUILDINGS)
+
+
+def run_vegetation_stage(location, is_online, osm_file, target_crs, base_directory, vegetation_shp_file):
+    """
+    Processes the vegetation data and writes it to a geodata file.
+
+    Parameters:
+    location (dict): The bounding box of the area of interest.
+    is_online (bool): Whether to process online or offline.
+    osm_file (str): The path to the OSM file.
+    target_crs (str): The target CRS of the geodata file.
+    base_directory (str): The base directory for the project.
+    vegetation_shp_file (str): The name of the vegetation geodata file.
+
+    Returns:
+    None
+    """
+    parks_gdf = Parks(location).process_parks(is_online, osm_file)
+    create_geofile(parks_gdf, target_crs, base_directory, vegetation_shp_file,
+                   schema=SCHEMA_VEGETATION)
+
+
+def run_weather_stage(base_directory, weather_file, met_file, output_weather_file, weather_day, weather_hour):
+    """
+    Processes the weather data and writes the weather and met files.
+
+    Parameters:
+    base_directory (str): The base directory for the project.
+    weather_file (str): The path to the weather data file.
+    met_file (str): The name of the met file.
+    output_weather_file (str): The name of the output weather data file.
+    weather_day (str): The day of the weather data to extract, format (dd.mm.yyyy).
+    weather_hour (str): The hour of the weather data to extract, format (hh:mm).
+
+    Returns:
+    None
+    """
+    weather_module = Weather(base_directory)
+    if weather_file is None:
+        print("No weather file specified, creating default weather and met files...")
+        weather_df, met_file_df = weather_module.create_default_files()
+        weather_module.write_many([
+            (weather_df, f'default_{output_weather_file}.csv', False),
+            (met_file_df, met_file, True),
+        ])
+    else:
+        weather_df, met_file_df = weather_module.process_weather_data(
+            weather_file)
+        # Collect every slice first, then write them in one batch
+        frames = [
+            (weather_df, f'{output_weather_file}.csv', False),
+            (met_file_df, met_file, True),
+        ]
+        if not weather_day is None:
+            # The legacy pipeline keeps fecha as datetime64; match the key
+            # to the column dtype so the group lookup compares integers
+            if pd.api.types.is_datetime64_any_dtype(met_file_df['fecha']):
+                day_key = pd.to_datetime(weather_day, format='%d.%m.%Y')
+            else:
+                day_key = weather_day
+            # Group once so the day slice comes from cached group indices
+            # instead of a full-column equality scan
+            day_groups = met_file_df.groupby('fecha', sort=False)
+            try:
+                day_met_file_df = day_groups.get_group(day_key)
+            except KeyError:
+                day_met_file_df = met_file_df.iloc[0:0]
+            # Replace the point with a underscore
+            weather_day = weather_day.replace('.', '_')
+            frames.append(
+                (day_met_file_df, f'{met_file}_{weather_day}.met', True))
+            if not weather_hour is None:
+                hora = day_met_file_df['hora']
+                if pd.api.types.is_datetime64_any_dtype(hora):
+                    # The day slice is at most a day of rows, so formatting
+                    # it for the comparison is negligible
+                    hora = hora.dt.strftime('%H:%M')
+                # Compare on the raw array so the hour slice skips building
+                # and aligning an intermediate boolean Series
+                hour_met_file_df = day_met_file_df[
+                    hora.to_numpy() == weather_hour]
+                # Replace the colon with a underscore
+                weather_hour = weather_hour.replace(':', '_')
+                frames.append((
+                    hour_met_file_df,
+                    f'{met_file}_{weather_day}_{weather_hour}.met', True))
+        weather_module.write_many(frames)
 
 
 def main(args):
@@ -49,10 +278,10 @@ def main(args):
         # If the config argument is specified, read the config file
 
         if args.config:
-            root = XMLFileProcessor(args.config).get_root()
-            base_directory, net_file, osm_file, emissions_file, weather_file, met_file, gral_dll = XMLFileProcessor.get_input_from_xml(root)
-            buildings_shp_file, highways_shp_file, vegetation_shp_file = XMLFileProcessor.get_output_from_xml(root)
-            pollutant, hor_layers, particles_ps, dispertion_time, n_cores = XMLFileProcessor.get_gral_from_xml(root)
+            xml_processor = XMLFileProcessor(args.config)
+            base_directory, net_file, osm_file, emissions_file, weather_file, met_file, gral_dll = xml_processor.get_input_from_xml()
+            buildings_shp_file, highways_shp_file, vegetation_shp_file = xml_processor.get_output_from_xml()
+            pollutant, hor_layers, particles_ps, dispertion_time, n_cores = xml_processor.get_gral_from_xml()
 
             print(f'net-file: {net_file}')
             print(f'osm-file: {osm_file}')
@@ -93,66 +322,69 @@ def main(args):
             "west": args.west
         }
 
+        # Parse the target CRS once for every geodata write; a CRS object
+        # skips geopandas re-parsing the EPSG string on each call and
+        # accepts the epsg argument as either an int or a string code
+        target_crs = pyproj.CRS.from_epsg(int(args.epsg))
+
+        # Create the output directory once instead of on every write
+        os.makedirs(base_directory, exist_ok=True)
+
+        # Convert the bounding box once; the map and gral branches reuse it
+        location_epsg_new = None
+        if None not in (args.north, args.south, args.east, args.west):
+            location_epsg_new = convert_bbox_to_epsg(location, args.epsg)
+
         # Create objects for each module
-        buildings_module = Buildings(location)
-        parks_module = Parks(location)
-        weather_module = Weather(base_directory)
         highways_module = Highways(location)
         maps_module = Maps(base_directory)
         gral_module = GRAL(base_directory, met_file,
                             buildings_shp_file, vegetation_shp_file, highways_shp_file)
         
-        # Read the SUMO network file
-        net_file = sumo.net.readNet(f'{net_file}')
+        # Read the SUMO network file, reusing the cached parse when possible
+        net_file = read_net_cached(f'{net_file}', base_directory)
 
-        # Process based on the specified argument
-        if args.process in ['all','buildings']:
-            buildings_gdf = buildings_module.process_buildings(args.is_online, osm_file=osm_file)
-            create_shapefile(
-                buildings_gdf,
-                f"EPSG:{args.epsg}",
-                base_directory,
-                buildings_shp_file
-            )
-        
-        if args.process in ['all', 'vegetation']:
-            parks_gdf = parks_module.process_parks(args.is_online, osm_file)
-            create_shapefile(
-                parks_gdf,
-                f"EPSG:{args.epsg}",
-                base_directory,
-                "vegetation.shp"
-            )
+        # Resolve the requested stages once; set membership replaces the
+        # repeated list scans below (map is only run when asked for explicitly)
+        if args.process == 'all':
+            stages = {'buildings', 'vegetation', 'weather', 'highways', 'gral'}
+        else:
+            stages = {args.process}
+
+        # The buildings, vegetation and weather stages share no state until the
+        # gral stage consumes their output files, so run them on separate
+        # processes when the whole pipeline is requested
+        stage_executor = None
+        pending_stages = []
+        if args.process == 'all':
+            stage_executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=3)
 
-        if args.process in ['all', 'weather']:
-            if weather_file is None:
-                print("No weather file specified, creating default weather and met files...")
-                weather_df, met_file_df = weather_module.create_default_files()
-                weather_module.write_to_files(
-                    weather_df, f'default_{args.output_weather_file}.csv', False)
-                weather_module.write_to_files(met_file_df, met_file)
+        # Geodata writes block only the gral stage, which reads the files
+        # back from disk; run them on a small thread pool in the meantime
+        io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        pending_writes = []
+
+        def run_stage(stage, *stage_args):
+            if stage_executor is not None:
+                pending_stages.append(stage_executor.submit(stage, *stage_args))
             else:
-                weather_df, met_file_df = weather_module.process_weather_data(
-                    weather_file)
-                weather_module.write_to_files(
-                    weather_df, f'{args.output_weather_file}.csv', False)
-                weather_module.write_to_files(met_file_df, met_file)
-                if not args.weather_day is None:
-                    day_met_file_df = met_file_df[met_file_df['fecha']
-                                                == args.weather_day]
-                    # Replace the point with a underscore
-                    args.weather_day = args.weather_day.replace('.', '_')
-                    weather_module.write_to_files(
-                        day_met_file_df, f'{met_file}_{args.weather_day}.met')
-                    if not args.weather_hour is None:
-                        hour_met_file_df = day_met_file_df[(
-                            day_met_file_df['hora'] == args.weather_hour)]
-                        # Replace the colon with a underscore
-                        args.weather_hour = args.weather_hour.replace(':', '_')
-                        weather_module.write_to_files(
-                            hour_met_file_df, f'{met_file}_{args.weather_day}_{args.weather_hour}.met')
-
-        if args.process in ['all', 'highways']:
+                stage(*stage_args)
+
+        # Process based on the specified argument
+        if 'buildings' in stages:
+            run_stage(run_buildings_stage, location, args.is_online, osm_file,
+                      target_crs, base_directory, buildings_shp_file)
+
+        if 'vegetation' in stages:
+            run_stage(run_vegetation_stage, location, args.is_online, osm_file,
+                      target_crs, base_directory, "vegetation.shp")
+
+        if 'weather' in stages:
+            run_stage(run_weather_stage, base_directory, weather_file, met_file,
+                      args.output_weather_file, args.weather_day, args.weather_hour)
+
+        if 'highways' in stages:
 
             highway_gdf = highways_module.process_highway_data(args.is_online, net_file, osm_file)
             
@@ -164,72 +396,94 @@ def main(args):
             # Combine the sumo emissions and highway data
             highway_emissions_gdf = highways_module.combine_sumo_emissions_and_highway_data(args.is_online,
                 sumo_emissions_df, highway_gdf)
-            
-            # Create the shapefile
-            create_shapefile(highway_emissions_gdf,
-                                f"EPSG:{args.epsg}", base_directory, highways_shp_file)
 
-        if args.process in ['map']:
+            # Quantize the osmid column so it writes as the narrowest integer
+            # field instead of a wide text field; way ids can exceed int32,
+            # so let pandas pick the smallest width that fits. Online mode
+            # stringifies merged-way id lists ("[123, 456]"), which must
+            # survive as-is, so only convert when every id is numeric
+            if 'osmid' in highway_emissions_gdf.columns:
+                osmid_numeric = pd.to_numeric(
+                    highway_emissions_gdf['osmid'], errors='coerce')
+                if not osmid_numeric.isna().any():
+                    highway_emissions_gdf['osmid'] = pd.to_numeric(
+                        osmid_numeric, downcast='integer')
+
+            # Write the geodata file in the background; the gral stage
+            # waits for it before reading the line emissions back
+            pending_writes.append(io_executor.submit(
+                create_geofile, highway_emissions_gdf, target_crs,
+                base_directory, highways_shp_file, schema=SCHEMA_HIGHWAYS))
+
+        if 'map' in stages:
             if not args.is_online:
                 net_file_processor = NetFileProcessor(net_file)
                 location = net_file_processor.get_bounds_from_net_file()
-            # Convert the coordinates to EPSG
-            west_point_epsg_new_x, north_point_epsg_new_y = maps_module.convert_coordinates(
-                location["west"], location["north"], 4326, args.epsg)
-            east_point_epsg_new_x, south_point_epsg_new_y = maps_module.convert_coordinates(
-                location["east"], location["south"], 4326, args.epsg)
-
-            # Dictionary with the location coordinates in EPSG:3857
-            location_epsg_new = {"north": north_point_epsg_new_y, "south": south_point_epsg_new_y,
-                                "east": east_point_epsg_new_x, "west": west_point_epsg_new_x}
+                location_epsg_new = convert_bbox_to_epsg(location, args.epsg)
             maps_module.create_georeferenced_map(
                 location_epsg_new,
                 args.epsg,
                 args.map_filename
             )
-        if args.process in ['all', 'gral']:
-            if args.north is None or args.south is None or args.east is None or args.west is None:
+        if 'gral' in stages:
+            # Wait for the parallel stages and pending writes; the GRAL
+            # inputs are built from the files they produce
+            for stage_future in pending_stages:
+                stage_future.result()
+            if stage_executor is not None:
+                stage_executor.shutdown()
+            for write_future in pending_writes:
+                write_future.result()
+
+            if location_epsg_new is None:
                 net_file_processor = NetFileProcessor(net_file)
                 location = net_file_processor.get_bounds_from_net_file()
-            
-            # Generate the files for GRAL executable
-            # Convert the coordinates to EPSG
-            west_point_epsg_new_x, north_point_epsg_new_y = maps_module.convert_coordinates(
-                location["west"], location["north"], 4326, args.epsg)
-            east_point_epsg_new_x, south_point_epsg_new_y = maps_module.convert_coordinates(
-                location["east"], location["south"], 4326, args.epsg)
-
-            # Dictionary with the location coordinates in EPSG:3857
-            location_epsg_new = {"north": north_point_epsg_new_y, "south": south_point_epsg_new_y,
-                                    "east": east_point_epsg_new_x, "west": west_point_epsg_new_x}
-            
+                location_epsg_new = convert_bbox_to_epsg(location, args.epsg)
+
             # Define the pollutant to simulate
             pollutant = gral_module.check_pollutant(pollutant)
             # Define horizontal layers to simulate in meters
             horizontal_layers = gral_module.check_horizontal_layers(hor_layers)
-            # Create the GREB file
-            gral_module.create_greb_file(bbox=location_epsg_new, horizontal_slices=len(horizontal_layers))
-            # Create the in.dat file
             mean_latitude = (location["north"] + location["south"]) / 2
-            gral_module.create_in_dat_file(particles_ps=particles_ps, dispertion_time=dispertion_time, latitude=mean_latitude, horizontal_slices=horizontal_layers)
-            # Create the meteoptg.all file
-            gral_module.create_meteopgt_file()
-            # Create the other required files
-            gral_module.create_other_txt_requiered_files(pollutant=pollutant, n_cores=n_cores)
-            # Create the buildings file
-            gral_module.create_buildings_file()
-            # Create the vegetation file
-            gral_module.create_vegetation_file()
-            # Create the line emission sources file
-            gral_module.create_line_emissions_file(pollutant=pollutant, is_online=args.is_online)
+            # The small GRAL input files are independent text writes; run
+            # them on a thread pool so they overlap with the line emissions
+            # file, which re-reads the highways layer and is the long pole
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as gral_writers:
+                small_writes = [
+                    gral_writers.submit(gral_module.create_greb_file,
+                                        bbox=location_epsg_new,
+                                        horizontal_slices=len(horizontal_layers)),
+                    gral_writers.submit(gral_module.create_in_dat_file,
+                                        particles_ps=particles_ps,
+                                        dispertion_time=dispertion_time,
+                                        latitude=mean_latitude,
+                                        horizontal_slices=horizontal_layers),
+                    gral_writers.submit(gral_module.create_meteopgt_file),
+                    gral_writers.submit(gral_module.create_other_txt_requiered_files,
+                                        pollutant=pollutant, n_cores=n_cores),
+                    gral_writers.submit(gral_module.create_buildings_file),
+                    gral_writers.submit(gral_module.create_vegetation_file),
+                ]
+                # Create the line emission sources file
+                gral_module.create_line_emissions_file(pollutant=pollutant, is_online=args.is_online)
+                # Every input file must exist before GRAL starts
+                for write in small_writes:
+                    write.result()
             # Create the other optional files
             gral_module.create_other_optional_files()
             # Run the GRAL executable
-            # subprocess.run(["dotnet", "run", "--project", gral_dll], check=True)
-            subprocess.run(["dotnet", os.path.abspath(gral_dll)], check=True, cwd=base_directory)
+            # Discard the voluminous progress output but keep stderr on the
+            # console so a failed simulation still shows its diagnostics; the
+            # server GC benefits compute-bound .NET workloads
+            gral_env = {**os.environ, "DOTNET_gcServer": "1"}
+            subprocess.run(["dotnet", os.path.abspath(gral_dll)], check=True,
+                           cwd=base_directory, stdout=subprocess.DEVNULL,
+                           env=gral_env)
             # Rename the results files to make them more descriptive
             n_meteo_conditions = gral_module.get_number_of_weather_conditions()
             gral_module.rename_results(pollutant=pollutant, horizontal_layers=horizontal_layers, n_meteo_conditions=n_meteo_conditions)
+
+        io_executor.shutdown(wait=True)
     else:
         # Create the results processor
         results_processor = ResultsProcessor()
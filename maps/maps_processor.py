@@ -1,10 +1,77 @@
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import cartopy.crs as ccrs
 import cartopy.io.img_tiles as cimgt
-from urllib.request import Request, urlopen
+import concurrent.futures
+import functools
 import io
+import math
+import os
+import tempfile
 from PIL import Image
 import pyproj
+import urllib3
+
+
+# One keep-alive pool serves every tile request, so only the first tile per
+# host pays the TCP/TLS handshake
+_HTTP = urllib3.PoolManager(
+    num_pools=4, maxsize=16,
+    headers={'User-Agent': 'Anaconda 3'},
+    retries=urllib3.Retry(3, backoff_factor=0.2))
+
+# Tiles persist across runs here; a repeated render of the same area reads
+# them back at disk speed instead of refetching over the network
+_TILE_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'sumo2gral', 'osm_tiles')
+
+# Half the extent of the web-mercator plane in meters
+_WEBMERC_EXTENT = 20037508.342789244
+
+
+def _mercator_to_tile(x, y, zoom):
+    """
+    Convert EPSG:3857 coordinates to fractional slippy-map tile indices.
+    """
+    n = 2 ** zoom
+    tile_x = (x + _WEBMERC_EXTENT) / (2 * _WEBMERC_EXTENT) * n
+    tile_y = (_WEBMERC_EXTENT - y) / (2 * _WEBMERC_EXTENT) * n
+    return tile_x, tile_y
+
+
+@functools.lru_cache(maxsize=None)
+def _make_transformer(src_crs, dst_crs):
+    """
+    Build (and memoize) a pyproj Transformer between two EPSG codes.
+    """
+    return pyproj.Transformer.from_crs(
+        f"EPSG:{src_crs}", f"EPSG:{dst_crs}", always_xy=True)
+
+
+def _tile_cache_path(tile):
+    x, y, z = tile
+    return os.path.join(_TILE_CACHE_DIR, str(z), str(x), f'{y}.png')
+
+
+def _tile_cache_get(tile):
+    try:
+        with open(_tile_cache_path(tile), 'rb') as cached_tile:
+            return cached_tile.read()
+    except OSError:
+        return None
+
+
+def _tile_cache_put(tile, data):
+    path = _tile_cache_path(tile)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename keeps concurrent readers from seeing a partial tile
+        with tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(path), delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+    except OSError:
+        pass
 
 
 class MapGenerator:
@@ -40,31 +107,125 @@ class MapGenerator:
         """
         print("Creating georeferenced map...")
 
-        # Plot using Cartopy
-        fig, ax = plt.subplots(
-            subplot_kw={'projection': ccrs.epsg(f'{epsg}')})
+        # Web-mercator output shares the tile grid's own projection, so the
+        # tiles can be pasted and cropped directly without the whole
+        # matplotlib/cartopy rendering stack
+        if str(epsg) == '3857':
+            try:
+                self._create_map_from_tiles(location, epsg, filename)
+                return
+            except Exception as e:
+                print(f"Tile stitching failed ({e}), rendering with cartopy...")
+
+        # Fix the output geometry up front: a 3000-px-wide canvas whose
+        # height follows the bounding-box aspect ratio, with the axes
+        # filling the whole figure, makes the rendered pixel grid (and so
+        # the .pgw resolutions) deterministic with no layout passes
+        dpi = 300
+        width_px = 3000
+        height_px = int(width_px * (location["north"] - location["south"]) /
+                        (location["east"] - location["west"]))
+        projection = ccrs.epsg(f'{epsg}')
+        fig = plt.figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi,
+                         constrained_layout=False)
+        ax = fig.add_axes([0, 0, 1, 1], projection=projection)
         ax.set_extent([location["west"], location["east"],
-                       location["south"], location["north"]], crs=ccrs.epsg(f'{epsg}'))
+                       location["south"], location["north"]], crs=projection)
+        ax.set_axis_off()
 
         # Add OSM image as background
-        osm_img = cimgt.OSM()
+        osm_img = CachedOSMTiles()
         zoom = 16    # Adjust this value to suit your needs
         ax.add_image(osm_img, zoom)
 
+        # Render once through the Agg canvas; print_to_buffer hands back the
+        # RGBA pixels and their size, so the PNG never has to be re-read for
+        # the .pgw resolution and the bbox_inches='tight' re-render is gone
+        canvas = FigureCanvasAgg(fig)
+        buf, (width_of_png_image, height_of_png_image) = canvas.print_to_buffer()
+        plt.close(fig)
+
         # Save to PNG
         output_filename = f'{self.base_directory}/{filename}_epsg{epsg}.png'
-        plt.savefig(output_filename, dpi=300, bbox_inches='tight',
-                    pad_inches=0)  # Adjust for tight layout
-        plt.close()
-
-        # Read the image
-        im = Image.open(output_filename)
-        width_of_png_image = im.width
-        height_of_png_image = im.height
-        resolution_x = (location["east"] -
-                        location["west"]) / width_of_png_image
-        resolution_y = (location["south"] -
-                        location["north"]) / height_of_png_image
+        # Level-1 deflate is several times faster than PIL's default for a
+        # negligible size increase on a working file
+        Image.frombytes(
+            "RGBA", (width_of_png_image, height_of_png_image), buf
+        ).save(output_filename, format="PNG", optimize=False, compress_level=1)
+
+        self._write_pgw(output_filename, location,
+                        width_of_png_image, height_of_png_image)
+
+    def _create_map_from_tiles(self, location, epsg, filename, zoom=16):
+        """
+        Stitch the OSM tiles covering a web-mercator bounding box into a
+        georeferenced PNG with PIL, without going through matplotlib.
+
+        Args:
+            location (dict): The bounding box in EPSG:3857 coordinates.
+            epsg (str): The EPSG code of the map (must be 3857).
+            filename (str): The name of the map file.
+            zoom (int): The slippy-map zoom level. Defaults to 16.
+
+        Returns:
+            None
+        """
+        tx_west, ty_north = _mercator_to_tile(
+            location["west"], location["north"], zoom)
+        tx_east, ty_south = _mercator_to_tile(
+            location["east"], location["south"], zoom)
+        x0, x1 = int(math.floor(tx_west)), int(math.ceil(tx_east))
+        y0, y1 = int(math.floor(ty_north)), int(math.ceil(ty_south))
+        tiles = [(x, y, zoom) for x in range(x0, x1) for y in range(y0, y1)]
+
+        def fetch(tile):
+            data = _tile_cache_get(tile)
+            if data is None:
+                x, y, z = tile
+                response = _HTTP.request(
+                    'GET', f'https://a.tile.openstreetmap.org/{z}/{x}/{y}.png')
+                # urllib3 does not raise on HTTP errors; never cache or
+                # paste an error body
+                if response.status != 200:
+                    raise IOError(
+                        f"Tile {z}/{x}/{y} request failed with status {response.status}")
+                data = response.data
+                _tile_cache_put(tile, data)
+            return data
+
+        # Paste the tiles into one mosaic as the parallel fetches complete
+        mosaic = Image.new('RGB', ((x1 - x0) * 256, (y1 - y0) * 256))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as pool:
+            for tile, data in zip(tiles, pool.map(fetch, tiles)):
+                mosaic.paste(Image.open(io.BytesIO(data)).convert('RGB'),
+                             ((tile[0] - x0) * 256, (tile[1] - y0) * 256))
+
+        # Crop the mosaic to the exact bounding box
+        mosaic = mosaic.crop((
+            int(round((tx_west - x0) * 256)),
+            int(round((ty_north - y0) * 256)),
+            int(round((tx_east - x0) * 256)),
+            int(round((ty_south - y0) * 256))))
+        output_filename = f'{self.base_directory}/{filename}_epsg{epsg}.png'
+        mosaic.save(output_filename, optimize=False, compress_level=1)
+        self._write_pgw(output_filename, location,
+                        mosaic.width, mosaic.height)
+
+    def _write_pgw(self, output_filename, location, width_px, height_px):
+        """
+        Write the world file that georeferences a saved map PNG.
+
+        Args:
+            output_filename (str): The path of the saved PNG.
+            location (dict): The bounding box of the map.
+            width_px (int): The width of the PNG in pixels.
+            height_px (int): The height of the PNG in pixels.
+
+        Returns:
+            None
+        """
+        resolution_x = (location["east"] - location["west"]) / width_px
+        resolution_y = (location["south"] - location["north"]) / height_px
 
         # Generate .pgw file
         pgw_filename = output_filename.replace('.png', '.pngw')
@@ -115,8 +276,9 @@ class MapGenerator:
         - x_out, y_out: Arrays of transformed x and y coordinates.
         """
         try:
-            transformer = pyproj.Transformer.from_crs("EPSG:{}".format(
-                src_crs), "EPSG:{}".format(dst_crs), always_xy=True)
+            # Transformer construction walks the PROJ database; memoize it
+            # per CRS pair so repeated conversions reuse the same object
+            transformer = _make_transformer(src_crs, dst_crs)
             x_out, y_out = transformer.transform(x, y)
             return x_out, y_out
         except Exception as e:
@@ -125,13 +287,66 @@ class MapGenerator:
         
 
 
+class CachedOSMTiles(cimgt.OSM):
+    """
+    An OSM tile source that prefetches the tiles covering a domain in
+    parallel, so cartopy's serial assembly pass only hits a local cache.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tile_cache = {}
+
+    def image_for_domain(self, target_domain, target_z):
+        # Fetch every missing tile concurrently over the shared pool before
+        # cartopy walks them one by one; the downloads are independent GETs
+        # whose latency overlaps almost completely
+        missing = [tile for tile in self.find_images(target_domain, target_z)
+                   if tile not in self._tile_cache]
+        if missing:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=16) as pool:
+                for tile, data in zip(missing, pool.map(self._fetch_tile, missing)):
+                    if data is not None:
+                        self._tile_cache[tile] = data
+        return super().image_for_domain(target_domain, target_z)
+
+    def _fetch_tile(self, tile):
+        data = _tile_cache_get(tile)
+        if data is not None:
+            return data
+        try:
+            response = _HTTP.request('GET', self._image_url(tile))
+        except Exception:
+            # A failed prefetch falls back to the synchronous path
+            return None
+        if response.status != 200:
+            # urllib3 does not raise on HTTP errors; treat non-200 as a
+            # failed prefetch and never cache the error body
+            return None
+        data = response.data
+        _tile_cache_put(tile, data)
+        return data
+
+    def get_image(self, tile):
+        data = self._tile_cache.get(tile)
+        if data is None:
+            return image_spoof(self, tile)
+        img = Image.open(io.BytesIO(data)).convert(self.desired_tile_form)
+        return img, self.tileextent(tile), 'lower'
+
+
 def image_spoof(self, tile):
-    url = self._image_url(tile)  # get the url of the street map API
-    req = Request(url)  # start request
-    req.add_header('User-agent', 'Anaconda 3')  # add user agent to request
-    fh = urlopen(req)
-    im_data = io.BytesIO(fh.read())  # get image
-    fh.close()  # close url
-    img = Image.open(im_data)  # open image with PIL
+    data = _tile_cache_get(tile)  # serve a previously fetched tile from disk
+    if data is None:
+        url = self._image_url(tile)  # get the url of the street map API
+        response = _HTTP.request('GET', url)  # fetch over the keep-alive pool
+        if response.status != 200:
+            # urllib3 does not raise on HTTP errors the way urlopen did;
+            # surface the failure instead of caching the error body
+            raise IOError(
+                f"Tile request {url} failed with status {response.status}")
+        data = response.data
+        _tile_cache_put(tile, data)
+    img = Image.open(io.BytesIO(data))  # open image with PIL
     img = img.convert(self.desired_tile_form)  # set image format
     return img, self.tileextent(tile), 'lower'  # reformat for cartopy
@@ -1,7 +1,6 @@
 import numpy as np
 import osmnx as ox
 from geopandas import GeoDataFrame
-from shapely import geometry
 import numpy as np
 from tqdm import tqdm
 from local_files_processor.local_file_processor import OSMFileProcessor
@@ -56,13 +55,16 @@ class ParksProcessor:
         parks_gdf.reset_index(inplace=True)
         # # Remain only the relation element_type
         parks_gdf = parks_gdf[parks_gdf["element_type"] != "point"]
-        # Drop elements on the geometry columns that are not polygons
-        parks_gdf = parks_gdf[parks_gdf["geometry"].apply(
-            lambda x: isinstance(x, geometry.Polygon) or isinstance(x, geometry.MultiPolygon))]
-        # Remove the columns that we don't need
+        # Keep only polygonal geometries; geom_type is computed in GEOS
+        # instead of a per-row isinstance lambda
+        parks_gdf = parks_gdf[parks_gdf.geom_type.isin(
+            ("Polygon", "MultiPolygon"))]
+        # Remove the columns that we don't need before exploding, so the
+        # split copies fewer columns
         columns_we_need = ["osmid", "name", "geometry"]
-        # Replace all that contain a ',' with a nan value
         parks_gdf = parks_gdf[columns_we_need]
+        # One explode splits the multipolygons and resets the index itself
+        parks_gdf = parks_gdf.explode(index_parts=False, ignore_index=True)
         return parks_gdf
 
     def retrieve_park_data(self, is_online=False, osm_file=None) -> GeoDataFrame:
@@ -90,12 +92,6 @@ class ParksProcessor:
             parks_gdf = osm_file_processor.process_osm_file(type="parks")
 
             parks_gdf['element_type'] = 'relation'
-            
-            # Explode the multipolygons to create a polygon for each park
-            gdf_exploded= parks_gdf.explode()
-            
-            # Reset the index and drop the old index column
-            parks_gdf = gdf_exploded.reset_index(drop=True)
 
         else:
             parks_gdf = ox.features.features_from_bbox(
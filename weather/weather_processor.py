@@ -1,5 +1,30 @@
+import concurrent.futures
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+# Hours counted as night for the Pasquill classification; a frozenset is
+# hashed once by pandas' isin instead of scanned per element
+_NIGHT_HOURS = frozenset({"21:00", "22:00", "23:00", "00:00", "01:00",
+                          "02:00", "03:00", "04:00", "05:00", "06:00"})
+
+# Wind-speed band edges and the day/night Pasquill class table used by
+# create_stability_class; built once instead of per call
+_STABILITY_BINS = np.array([-np.inf, 2, 3, 5, 6, np.inf])
+_STABILITY_TABLE = np.array([[1, 2, 2, 3, 3],
+                             [5, 5, 6, 6, 6]], dtype=np.int8)
+
+# Columns excluded from the met file output
+_MET_DROP_COLUMNS = frozenset({'H.Rel.', 'Veloc.máx.', 'Precip.',
+                               'Temp.', 'R.Sol.', 'Pres.'})
+
 
 class WeatherDataProcessor:
     """
@@ -7,11 +32,11 @@ class WeatherDataProcessor:
 
     Methods:
     - retrieve_weather_data(file_name: str) -> pd.DataFrame
-    - change_comma_to_dot(df: pd.DataFrame) -> pd.DataFrame
     - rename_df_columns(df: pd.DataFrame) -> pd.DataFrame
     - create_stability_class(df: pd.DataFrame) -> pd.DataFrame
     - create_met_file(df: pd.DataFrame) -> pd.DataFrame
     - process_weather_data(file_name: str) -> Tuple[pd.DataFrame, pd.DataFrame]
+    - process_many(file_names: list) -> dict
     """
 
     def __init__(self, base_directory):
@@ -36,10 +61,45 @@ class WeatherDataProcessor:
         try:
             # Check if the file is a pure csv file
             if file_name.endswith(".csv"):
-                weather_df = pd.read_csv(f'{file_name}')
-                return weather_df, False 
+                try:
+                    # The pyarrow engine tokenizes the CSV in parallel and
+                    # the narrow dtypes halve the frame's memory footprint
+                    weather_df = pd.read_csv(
+                        f'{file_name}', engine='pyarrow',
+                        dtype={'direction': 'int32',
+                               'wind_speed': 'float32'})
+                except (ImportError, ValueError, TypeError):
+                    # Older pandas, a missing pyarrow, or values the narrow
+                    # dtypes cannot hold fall back to the default parser
+                    weather_df = pd.read_csv(f'{file_name}')
+                return weather_df, False
+            # decimal=',' converts the comma decimals at parse time in C,
+            # so no comma-to-dot string pass is needed afterwards
+            if PYARROW_AVAILABLE:
+                try:
+                    # Arrow fuses the read, the decimal-comma conversion and
+                    # the type inference into one multithreaded native pass
+                    table = pacsv.read_csv(
+                        f'{file_name}',
+                        read_options=pacsv.ReadOptions(
+                            skip_rows=3, skip_rows_after_names=1,
+                            encoding='iso-8859-1'),
+                        parse_options=pacsv.ParseOptions(delimiter='\t'),
+                        convert_options=pacsv.ConvertOptions(
+                            decimal_point=','))
+                    return table.to_pandas(), True
+                except Exception:
+                    # Layouts arrow's reader rejects go through pandas
+                    pass
+            # Narrow float dtypes let the C parser allocate half-width
+            # buffers directly; sensor precision never needs float64
             weather_df = pd.read_csv(f'{file_name}',
-                                sep='\t', skiprows=[0, 1, 2, 4], encoding="ISO-8859-1")
+                                sep='\t', skiprows=[0, 1, 2, 4], encoding="ISO-8859-1",
+                                decimal=',',
+                                dtype={'Veloc.': 'float32', 'Veloc.máx.': 'float32',
+                                       'Precip.': 'float32', 'Temp.': 'float32',
+                                       'H.Rel.': 'float32', 'R.Sol.': 'float32',
+                                       'Pres.': 'float32'})
             return weather_df, True
         except FileNotFoundError:
             raise FileNotFoundError(
@@ -47,24 +107,6 @@ class WeatherDataProcessor:
         except Exception as e:
             raise Exception(f"An error occurred retrieving weather data. Error: {e}")
 
-    @staticmethod
-    def change_comma_to_dot(df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Replaces commas with dots in specific columns of a pandas DataFrame.
-
-        Args:
-        - df: pandas DataFrame
-
-        Returns:
-        - df: pandas DataFrame with commas replaced by dots in specific columns
-        """
-        columns_to_change = ["Veloc.", "Veloc.máx.", "Precip.", "Temp."]
-        for column in df.columns:
-            if df[column].name in columns_to_change:
-                df[column] = df[column].str.replace(",", ".")
-                df[column] = df[column].astype(float)
-        return df
-
     @staticmethod
     def rename_df_columns(df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -91,39 +133,26 @@ class WeatherDataProcessor:
             pd.DataFrame: Output dataframe with an additional column "stability_class" containing the stability class for each row.
         """
         # Pasquill stabilitiy classes 1 is very unstable, 7 is very stable
-        stability_class = [1, 2, 3, 4, 5, 6, 7]
-        night_hours = ["21:00", "22:00", "23:00", "00:00",
-                       "01:00", "02:00", "03:00", "04:00", "05:00", "06:00"]
-        # Iterate over all the rows in the dataframe and for each row add the stability class depending on the wind speed and the time of the day (hora)
         wind_speed = "Veloc."
         time = "hora"
         if not is_legacy_file:
             wind_speed = "wind_speed"
             time = "time"
-        
-        for index, row in df.iterrows():
-            if row[time] not in night_hours:
-                if row[wind_speed] < 2:
-                    df.loc[index, "stability_class"] = stability_class[0]
-                elif row[wind_speed] >= 2 and row[wind_speed] < 3:
-                    df.loc[index, "stability_class"] = stability_class[1]
-                elif row[wind_speed] >= 3 and row[wind_speed] < 5:
-                    df.loc[index, "stability_class"] = stability_class[1]
-                elif row[wind_speed] >= 5 and row[wind_speed] < 6:
-                    df.loc[index, "stability_class"] = stability_class[2]
-                elif row[wind_speed] >= 6:
-                    df.loc[index, "stability_class"] = stability_class[2]
-            else:
-                if row[wind_speed] < 2:
-                    df.loc[index, "stability_class"] = stability_class[4]
-                elif row[wind_speed] >= 2 and row[wind_speed] < 3:
-                    df.loc[index, "stability_class"] = stability_class[4]
-                elif row[wind_speed] >= 3 and row[wind_speed] < 5:
-                    df.loc[index, "stability_class"] = stability_class[5]
-                elif row[wind_speed] >= 5 and row[wind_speed] < 6:
-                    df.loc[index, "stability_class"] = stability_class[5]
-                elif row[wind_speed] >= 6:
-                    df.loc[index, "stability_class"] = stability_class[5]
+
+        # Classify every row with one binary search into the wind-speed
+        # bands and one gather from the 2x5 day/night class table; no
+        # per-band comparison passes remain in the hot path
+        ws = df[wind_speed].to_numpy()
+        time_col = df[time]
+        if pd.api.types.is_datetime64_any_dtype(time_col):
+            # Two integer compares on the hour instead of string hashing
+            hour = time_col.dt.hour.to_numpy()
+            night = (hour >= 21) | (hour <= 6)
+        else:
+            night = time_col.isin(_NIGHT_HOURS).to_numpy()
+        idx = np.searchsorted(_STABILITY_BINS, ws, side='right') - 1
+        idx = np.clip(idx, 0, _STABILITY_TABLE.shape[1] - 1)
+        df["stability_class"] = _STABILITY_TABLE[night.astype(np.int8), idx]
 
         return df
 
@@ -139,9 +168,9 @@ class WeatherDataProcessor:
             pandas.DataFrame: The updated DataFrame with unnecessary columns removed.
         """
 
-        df.drop(columns=['H.Rel.', 'Veloc.máx.', 'Precip.',
-                'Temp.', 'R.Sol.', 'Pres.'], inplace=True)
-        return df
+        # Selecting the kept columns avoids the in-place drop's block
+        # rewrite and is a zero-copy view under copy-on-write
+        return df[[col for col in df.columns if col not in _MET_DROP_COLUMNS]]
 
     def process_weather_data(self, file_name):
         """
@@ -156,36 +185,51 @@ class WeatherDataProcessor:
         
         weather_df, is_legacy_file = self.retrieve_weather_data(file_name)
         if is_legacy_file:
-            weather_df = self.change_comma_to_dot(weather_df)
             weather_df = self.rename_df_columns(weather_df)
 
-            weather_df.dropna(inplace=True)
-            weather_df['fecha'] = weather_df['fecha'].str.replace('/', '.')
-            weather_df["hora"] = weather_df["hora"].astype(str)+":00"
-            weather_df['Direc.'] = weather_df['Direc.'].astype(int)
-            weather_df['fecha'] = pd.to_datetime(
-                weather_df['fecha'], format='%d.%m.%Y')
-            weather_df['hora'] = pd.to_datetime(
-                weather_df['hora'], format='%H:%M')
-            weather_df.sort_values(by=['fecha', 'hora'], inplace=True)
+            def _parse_hora(d):
+                # Integer hours convert to datetimes arithmetically; the
+                # string concat plus strptime path only runs for
+                # non-numeric sources
+                hours = pd.to_numeric(d['hora'], errors='coerce')
+                if hours.notna().all():
+                    return pd.to_datetime(hours.astype(np.int64), unit='h')
+                return pd.to_datetime(
+                    d['hora'].astype(str) + ':00', format='%H:%M',
+                    cache=True)
+
+            # One chained pipeline: dropna feeds a single assign that
+            # computes the parsed columns together, then the sort; no
+            # column-by-column in-place mutation between copies. Direc.
+            # holds compass degrees, so int16 is plenty.
+            weather_df = (
+                weather_df
+                .dropna()
+                .assign(
+                    fecha=lambda d: pd.to_datetime(
+                        d['fecha'], format='%d/%m/%Y', cache=True),
+                    hora=_parse_hora,
+                    **{'Direc.': lambda d: pd.to_numeric(
+                        d['Direc.'], downcast='unsigned')})
+                .sort_values(by=['fecha', 'hora']))
+            # create_stability_class already stores the classes as int8
             weather_df = self.create_stability_class(weather_df, is_legacy_file)
-            weather_df['stability_class'] = weather_df['stability_class'].astype(
-                int)
 
-            weather_df['fecha'] = pd.to_datetime(
-                weather_df['fecha'], format='%d.%m.%Y').dt.strftime('%d.%m.%Y')
-            weather_df['hora'] = pd.to_datetime(
-                weather_df['hora'], format='%H:%M').dt.strftime('%H:%M')
+            # fecha/hora stay datetime64 so downstream slicing compares
+            # integers; write_to_files formats the output strings
             met_file_df = self.create_met_file(weather_df)
+            # Both outputs have always shared the trimmed column set; keep
+            # that now that create_met_file no longer mutates its input
+            weather_df = met_file_df
 
             return weather_df, met_file_df
         else:   
             weather_df.dropna(inplace=True)
-            weather_df['direction'] = weather_df['direction'].astype(int)
+            weather_df['direction'] = pd.to_numeric(
+                weather_df['direction'], downcast='unsigned')
             weather_df.sort_values(by=['date', 'time'], inplace=True)
+            # create_stability_class already stores the classes as int8
             weather_df = self.create_stability_class(weather_df, is_legacy_file)
-            weather_df['stability_class'] = weather_df['stability_class'].astype(
-                int)
             
             met_file_df = weather_df.copy()
 
@@ -194,6 +238,22 @@ class WeatherDataProcessor:
         
         
             
+    def process_many(self, file_names):
+        """
+        Processes several weather files in parallel worker processes.
+
+        Args:
+            file_names (list): The names of the weather files to process.
+
+        Returns:
+            dict: A mapping of each file name to its (weather_df, met_file_df) tuple.
+        """
+        # Each file is independent, so the parse-and-classify pipeline
+        # scales with cores; processes sidestep the GIL entirely
+        with concurrent.futures.ProcessPoolExecutor() as pool:
+            results = list(pool.map(self.process_weather_data, file_names))
+        return dict(zip(file_names, results))
+
     @staticmethod
     def create_default_files():
         """
@@ -208,12 +268,68 @@ class WeatherDataProcessor:
 
         return weather_df, met_file_df
 
+    def write_many(self, frames):
+        """
+        Writes several dataframes to their files in one batch.
+
+        Args:
+            frames (list): A list of (df, file_name, is_met_file) tuples.
+
+        Returns:
+            None
+        """
+        for df, file_name, is_met_file in frames:
+            self.write_to_files(df, file_name, is_met_file)
+
+    @staticmethod
+    def _format_datetime_columns(df):
+        """
+        Formats datetime64 fecha/hora columns to their output strings.
+
+        Args:
+            df (pandas.DataFrame): The DataFrame about to be written.
+
+        Returns:
+            pandas.DataFrame: The DataFrame with string-formatted columns.
+        """
+        formatted = {}
+        if 'fecha' in df.columns and \
+                pd.api.types.is_datetime64_any_dtype(df['fecha']):
+            formatted['fecha'] = df['fecha'].dt.strftime('%d.%m.%Y')
+        if 'hora' in df.columns and \
+                pd.api.types.is_datetime64_any_dtype(df['hora']):
+            formatted['hora'] = df['hora'].dt.strftime('%H:%M')
+        if formatted:
+            df = df.assign(**formatted)
+        return df
+
     def write_to_files(self, df, file_name, is_met_file=True):
         try:
-            if is_met_file:
-                # Write no column names to the file
-                df.to_csv(f'{self.base_directory}/{file_name}', index=False, header=False)
-            else:
-                df.to_csv(f'{self.base_directory}/{file_name}', index=False)
+            path = f'{self.base_directory}/{file_name}'
+            # Dates are kept as datetime64 through the pipeline and only
+            # become strings here, at the write boundary
+            df = self._format_datetime_columns(df)
+            if PYARROW_AVAILABLE:
+                try:
+                    # Arrow serializes the rows in native code, far faster
+                    # than pandas' to_csv on full-year hourly frames
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    pacsv.write_csv(
+                        table, path,
+                        write_options=pacsv.WriteOptions(
+                            include_header=not is_met_file))
+                    return
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    # Frames arrow cannot represent fall through to pandas
+                    pass
+            # A wide buffered binary handle batches the write syscalls and
+            # skips text-mode newline translation
+            with open(path, 'wb', buffering=1 << 20) as csv_file:
+                if is_met_file:
+                    # Write no column names to the file
+                    df.to_csv(csv_file, index=False, header=False,
+                              lineterminator='\n')
+                else:
+                    df.to_csv(csv_file, index=False, lineterminator='\n')
         except Exception as e:
             raise IOError(f"Failed to write to {file_name}: {e}")